@@ -22,13 +22,17 @@ bl_info = {
     "category" : "UV"
 }
 
+import json
+
 import bmesh
 import bpy
 import mathutils
+import numpy as np
+from bpy_extras.io_utils import ExportHelper
 
 #Credit goes to Luca Carella for his UV Align Distribution Addon providing uv island selection functionality via the following imports
 #https://wiki.blender.org/index.php/Extensions:2.6/Py/Scripts/UV/UV_Align_Distribution
-from . import make_islands, utils
+from . import assign, audit, lod, make_islands, snapping, snapshot, strips, utils
 
 # Trims definition
 class TrimDef():
@@ -122,28 +126,88 @@ def FindBestMatch(island, variants):
   return currentTrimDefs[bestIndex]
 
 # /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
-def UltimateTrimAlign(props):
+def BestFitTrims(islands, props, padding, sizes = None):
+
+  #Solves the trim of all islands at once instead of picking the closest trim per island
+  if sizes is None:
+    sizes = []
+    for island in islands:
+      size = island.size()
+      sizes.append((size.width, size.height))
+
+  cost = assign.CostMatrix(sizes, currentTrimDefs, props.trim_variants, props.scale, padding)
+  return [currentTrimDefs[index] for index in assign.AssignTrims(cost, props.trim_capacity)]
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+def TrimBounds(trimDef, props, padding):
+
+  res = float(props.trim_res)
+
+  trimLeft = trimDef.x_offset + padding 
+  trimRight = trimDef.x_offset + trimDef.width - padding
+  trimTop = trimDef.y_offset - padding
+  trimBottom = trimDef.y_offset - trimDef.height + padding
+
+  #Pulls the padded trim bounds inwards onto the texel grid so fitted islands stay inside the padding
+  if props.texel_snap != 'NONE':
+    trimLeft = snapping.SnapValues(trimLeft, res, props.texel_target, 'CEIL')
+    trimRight = snapping.SnapValues(trimRight, res, props.texel_target, 'FLOOR')
+    trimTop = snapping.SnapValues(trimTop, res, props.texel_target, 'FLOOR')
+    trimBottom = snapping.SnapValues(trimBottom, res, props.texel_target, 'CEIL')
+
+  return trimLeft, trimRight, trimTop, trimBottom
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+def UltimateTrimAlign(props, selectedIslands = None):
 
   global currentTrimDefs
   currentTrimDefs = trimSets[props.trim_set]
 
   padding = props.uv_padding / float(props.trim_res)
+  res = float(props.trim_res)
   
   #Creates UV islands out of the selected elements
-  makeIslands = make_islands.MakeIslands()
-  selectedIslands = makeIslands.selectedIslands()
+  if selectedIslands is None:
+    makeIslands = make_islands.MakeIslands()
+    selectedIslands = makeIslands.selectedIslands()
+
+  #Gathers the UVs of all islands once to find bounds and identical shapes without per island passes
+  if props.reuse_duplicates:
+    loops, labels = utils.IslandLoops(selectedIslands)
+    uvs = utils.GetUVs(loops)
+    lowest, highest = utils.IslandBounds(uvs, labels, len(selectedIslands))
+    shapeKeys = utils.ShapeKeys(uvs, labels, lowest)
+
+  if props.trim_index >= 0:
+    trimDefs = [currentTrimDefs[props.trim_index]] * len(selectedIslands)
+  elif props.assign_mode == 'BEST_FIT':
+    trimDefs = BestFitTrims(selectedIslands, props, padding, highest - lowest if props.reuse_duplicates else None)
+  elif props.reuse_duplicates:
+    centers = (lowest + highest) * 0.5
+    trimDefs = [currentTrimDefs[index] for index in assign.NearestTrims(centers, currentTrimDefs, props.trim_variants)]
+  else:
+    trimDefs = [FindBestMatch(island, props.trim_variants) for island in selectedIslands]
+
+  #Scale and new lowest corner of every island shape already solved, keyed by shape and trim.
+  #The corner is only used on axes aligned to the trim, other axes scale about the island center
+  solvedShapes = {}
+  duplicates = np.zeros(len(selectedIslands), dtype=bool)
+  duplicateScales = np.ones((len(selectedIslands), 2))
+  duplicateTargets = np.zeros((len(selectedIslands), 2))
 
   #Loops through selected islands and aligns the top of each island with the top of the trim index
-  for island in selectedIslands:
-  
-    trimDef = currentTrimDefs[props.trim_index] if props.trim_index >= 0 else FindBestMatch(island, props.trim_variants)
+  for index, (island, trimDef) in enumerate(zip(selectedIslands, trimDefs)):
+
+    if props.reuse_duplicates:
+      shapeKey = (shapeKeys[index], id(trimDef))
+
+      if shapeKey in solvedShapes:
+        duplicates[index] = True
+        duplicateScales[index], duplicateTargets[index] = solvedShapes[shapeKey]
+        continue
   
-    trimLeft = trimDef.x_offset + padding 
-    trimRight = trimDef.x_offset + trimDef.width - padding
+    trimLeft, trimRight, trimTop, trimBottom = TrimBounds(trimDef, props, padding)
     trimHCenter = trimDef.x_offset + trimDef.width * 0.5
-  
-    trimTop = trimDef.y_offset - padding
-    trimBottom = trimDef.y_offset - trimDef.height + padding
     trimVCenter = trimDef.y_offset - trimDef.height * 0.5
   
     #print("Trim:", trimLeft, trimRight, trimTop, trimBottom)
@@ -170,6 +234,13 @@ def UltimateTrimAlign(props):
     elif props.scale == 'SET_XY':
       scaleX = props.size_x / size.width
       scaleY = props.size_y / size.height
+
+    #Rounds the free axis of a single axis fit to whole texels
+    if props.texel_snap == 'BOUNDS':
+      if props.scale == 'FIT_X':
+        scaleY = snapping.SnapSize(size.height * scaleY, res) / size.height
+      elif props.scale == 'FIT_Y':
+        scaleX = snapping.SnapSize(size.width * scaleX, res) / size.width
       
     #print("Scale: ", scaleX, scaleY)
       
@@ -196,8 +267,35 @@ def UltimateTrimAlign(props):
   
     island.move(mathutils.Vector((moveX, moveY)))
 
+    if props.reuse_duplicates:
+      bbox = island.BBox()
+      solvedShapes[shapeKey] = ((scaleX, scaleY), (bbox.left(), bbox.bottom()))
+
+  #Applies the solved transforms to all duplicates at once
+  if duplicates.any():
+    aligned = np.array([props.h_align != 'NONE', props.v_align != 'NONE'])
+    centers = (lowest + highest) * 0.5
+    anchors = np.where(aligned, duplicateTargets, centers - (centers - lowest) * duplicateScales)
+
+    duplicateLoops = duplicates[labels]
+    duplicateLabels = labels[duplicateLoops]
+    newUVs = (uvs[duplicateLoops] - lowest[duplicateLabels]) * duplicateScales[duplicateLabels] + anchors[duplicateLabels]
+    utils.SetUVs([loops[loop] for loop in np.nonzero(duplicateLoops)[0].tolist()], newUVs)
+
+  if props.texel_snap != 'NONE':
+    snapping.SnapIslands(selectedIslands, props)
+
+  #Cuts islands running past their trim into trim-length pieces
+  tiledPieces = 0
+  if props.split_strips:
+    for island, trimDef in zip(selectedIslands, trimDefs):
+      trimLeft, trimRight = TrimBounds(trimDef, props, padding)[:2]
+      tiledPieces += strips.SplitStrip(island, trimDef, currentTrimDefs, trimLeft, trimRight, props.split_layout)[1]
+
   utils.update()
 
+  return tiledPieces
+
 # /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 def UltimateEdgeAlign(props):
 
@@ -237,11 +335,149 @@ def UltimateEdgeAlign(props):
   utils.update()
 
 # /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
-class UltimateTrimUVProps(bpy.types.PropertyGroup):
-  setItems = []
-  for setName in trimSets:
-    setItems.append((setName, setName, ''))
+class RuleProps():
+  """Scene settings with the trim and alignment settings of a rule on top"""
+  ruleKeys = {'trim_set', 'trim_index', 'trim_variants', 'h_align', 'v_align', 'scale'}
+
+  def __init__(self, props, rule):
+    self.props = props
+    self.rule = rule
 
+  def __getattr__(self, name):
+    if name in RuleProps.ruleKeys:
+      return getattr(self.rule, name)
+    return getattr(self.props, name)
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+def FaceRules(rules, obj):
+
+  #Evaluates all rules over the faces of the edit mesh in bulk reads, the first matching rule wins
+  obj.update_from_editmode()
+  mesh = obj.data
+  numFaces = len(mesh.polygons)
+
+  materialIndices = np.empty(numFaces, dtype=np.int32)
+  hidden = np.empty(numFaces, dtype=bool)
+  mesh.polygons.foreach_get("material_index", materialIndices)
+  mesh.polygons.foreach_get("hide", hidden)
+
+  faceRules = np.full(numFaces, -1, dtype=np.int32)
+  attributes = {}
+
+  for ruleIndex in reversed(range(len(rules))):
+    rule = rules[ruleIndex]
+    if not rule.enabled:
+      continue
+
+    if rule.source == 'MATERIAL':
+      slots = [index for index, slot in enumerate(obj.material_slots) if rule.material is not None and slot.material == rule.material]
+      mask = np.isin(materialIndices, slots)
+    else:
+      if rule.attribute_name not in attributes:
+        attribute = mesh.attributes.get(rule.attribute_name)
+        values = None
+        if attribute is not None and attribute.domain == 'FACE' and attribute.data_type == 'INT':
+          values = np.empty(numFaces, dtype=np.int32)
+          attribute.data.foreach_get("value", values)
+        attributes[rule.attribute_name] = values
+
+      values = attributes[rule.attribute_name]
+      if values is None:
+        continue
+      mask = values == rule.attribute_value
+
+    faceRules[mask] = ruleIndex
+
+  faceRules[hidden] = -1
+  return faceRules
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+def UltimateTrimApplyRules(props, obj):
+
+  faceRules = FaceRules(props.rules, obj)
+  makeIslands = make_islands.MakeIslands()
+
+  #Groups islands by the rule most of their faces match
+  ruleIslands = {}
+  for island in makeIslands.getIslands():
+    votes = faceRules[np.fromiter(island, dtype=np.int32, count=len(island))]
+    votes = votes[votes >= 0]
+    if len(votes) == 0:
+      continue
+
+    ruleIndex = int(np.bincount(votes).argmax())
+    ruleIslands.setdefault(ruleIndex, []).append(island)
+
+  #Rules pointing past the end of their own trim set are skipped and reported
+  count = 0
+  skipped = []
+  for ruleIndex, islands in ruleIslands.items():
+    rule = props.rules[ruleIndex]
+    if rule.trim_index >= len(trimSets[rule.trim_set]):
+      skipped.append(rule.name)
+      continue
+
+    UltimateTrimAlign(RuleProps(props, rule), islands)
+    count += len(islands)
+
+  return count, skipped
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+def UltimateTrimAudit(props, objects):
+
+  global currentTrimDefs
+  currentTrimDefs = trimSets[props.trim_set]
+
+  #Collects the scale of the objects using each mesh so shared meshes are only scanned once
+  meshInstances = {}
+  for obj in objects:
+    if obj.type == 'MESH':
+      scale = abs(obj.matrix_world.to_3x3().determinant()) ** (1.0 / 3.0)
+      meshInstances.setdefault(obj.data, []).append(scale)
+
+  return audit.AuditMeshes(meshInstances, props, currentTrimDefs, FindBestMatch)
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+setItems = []
+for setName in trimSets:
+  setItems.append((setName, setName, ''))
+
+variantItems = [
+  ('ALL', "All", ""),
+  ('A', "A", ""), 
+  ('B', "B", ""),
+  ('C', "C", ""),
+  ('D', "D", ""),
+  ('S', "S", "")]
+
+hAlignItems = [('NONE', "None", ""), ('LEFT', "Left", ""), ('CENTER', "Center", ""), ('RIGHT', "Right", "")]
+vAlignItems = [('NONE', "None", ""), ('TOP', "Top", ""), ('CENTER', "Center", ""), ('BOTTOM', "Bottom", "")]
+scaleItems = [('NONE', "None", ""), ('FIT_X', "Fit X", ""), ('FIT_Y', "Fit Y", ""), ('FIT_BOTH', "Fit Both", ""), ('SET_X', "Set X", ""), ('SET_Y', "Set Y", ""), ('SET_XY', "Set XY", "")]
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class UltimateTrimRule(bpy.types.PropertyGroup):
+  name: bpy.props.StringProperty(name = "Name", default = "Rule")
+  enabled: bpy.props.BoolProperty(name = "Enabled", default = True)
+
+  source: bpy.props.EnumProperty(name = "Source", items=[
+      ('MATERIAL', "Material", "Matches faces using the given material"),
+      ('ATTRIBUTE', "Face Attribute", "Matches faces whose integer face attribute equals the given value")]
+  )
+  material: bpy.props.PointerProperty(name = "Material", type = bpy.types.Material)
+  attribute_name: bpy.props.StringProperty(name = "Attribute", default = "trim_id",
+    description = "Name of an integer face attribute, e.g. a face set layer"
+  )
+  attribute_value: bpy.props.IntProperty(name = "Value", default = 0)
+
+  trim_set: bpy.props.EnumProperty(items = setItems, name = "Trim Set")
+  trim_index: bpy.props.IntProperty(name = "", default = -1, min=-1, max=len(trimSets["UltimateTrim"])-1)
+  trim_variants: bpy.props.EnumProperty(items = variantItems, name = "Variant Types")
+  h_align: bpy.props.EnumProperty(name = "Horizontal Alignment", items = hAlignItems)
+  v_align: bpy.props.EnumProperty(name = "Vertical Alignment", default='TOP', items = vAlignItems)
+  scale: bpy.props.EnumProperty(name = "Scale", items = scaleItems)
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class UltimateTrimUVProps(bpy.types.PropertyGroup):
   trim_set: bpy.props.EnumProperty(
     items = setItems,
     name = "Trim Set"
@@ -266,22 +502,53 @@ class UltimateTrimUVProps(bpy.types.PropertyGroup):
     
   trim_index: bpy.props.IntProperty(name = "", default = -1, min=-1, max=len(trimSets["UltimateTrim"])-1)
   trim_variants: bpy.props.EnumProperty(
-     items=[
-        ('ALL', "All", ""),
-        ('A', "A", ""), 
-        ('B', "B", ""),
-        ('C', "C", ""),
-        ('D', "D", ""),
-        ('S', "S", "")],
+     items = variantItems,
      name = "Variant Types"
   )
+  assign_mode: bpy.props.EnumProperty(name = "Assignment", items=[
+      ('NEAREST', "Nearest", "Each island takes the trim closest to its current position"),
+      ('BEST_FIT', "Best Fit", "Assigns trims for the whole selection at once by aspect ratio, size and texel density")]
+  )
+  trim_capacity: bpy.props.IntProperty(name = "", default = 0, min = 0,
+    description = "Maximum number of islands per trim in 'Best Fit' assignment. 0 means no limit"
+  )
   
-  h_align: bpy.props.EnumProperty(name = "Horizontal Alignment", items=[('NONE', "None", ""), ('LEFT', "Left", ""), ('CENTER', "Center", ""), ('RIGHT', "Right", "")])
-  v_align: bpy.props.EnumProperty(name = "Vertical Alignment", default='TOP', items=[('NONE', "None", ""), ('TOP', "Top", ""), ('CENTER', "Center", ""), ('BOTTOM', "Bottom", "")])
-  scale: bpy.props.EnumProperty(name = "Scale", items=[('NONE', "None", ""), ('FIT_X', "Fit X", ""), ('FIT_Y', "Fit Y", ""), ('FIT_BOTH', "Fit Both", ""), ('SET_X', "Set X", ""), ('SET_Y', "Set Y", ""), ('SET_XY', "Set XY", "")])  
+  h_align: bpy.props.EnumProperty(name = "Horizontal Alignment", items = hAlignItems)
+  v_align: bpy.props.EnumProperty(name = "Vertical Alignment", default='TOP', items = vAlignItems)
+  scale: bpy.props.EnumProperty(name = "Scale", items = scaleItems)
   size_x: bpy.props.FloatProperty(name = "Size X", default = 1.0)
   size_y: bpy.props.FloatProperty(name = "Size Y", default = 1.0)
 
+  texel_snap: bpy.props.EnumProperty(name = "Texel Snap", items=[
+      ('NONE', "None", ""),
+      ('BOUNDS', "Bounds", "Snaps the island bounds to the texel grid of the trim resolution"),
+      ('VERTICES', "Vertices", "Snaps every UV vertex to the texel grid of the trim resolution")]
+  )
+  texel_target: bpy.props.EnumProperty(name = "Snap Target", items=[('EDGE', "Texel Edges", ""), ('CENTER', "Texel Centers", "")])
+
+  split_strips: bpy.props.BoolProperty(name = "Split Strips", default = False,
+    description = "Cuts islands that are wider than their trim along edge loops into trim-length pieces"
+  )
+  split_layout: bpy.props.EnumProperty(name = "Split Layout", items=[
+      ('TRIMS', "Next Trims", "Places the pieces on consecutive trims of the same size"),
+      ('TILE', "Tile", "Places all pieces on the island's trim, relying on the trim tiling horizontally")]
+  )
+
+  reuse_duplicates: bpy.props.BoolProperty(name = "Reuse Duplicates", default = False,
+    description = "Solve islands with identical UV shapes only once and apply the same transform to every copy. "
+    "Speeds up meshes with many instanced parts"
+  )
+
+  rules: bpy.props.CollectionProperty(type = UltimateTrimRule)
+  active_rule_index: bpy.props.IntProperty(name = "Active Rule", default = 0)
+
+  snapshot_name: bpy.props.StringProperty(name = "Snapshot", default = "A",
+    description = "Name of the UV snapshot stored next to the .blend file"
+  )
+  snapshot_compare: bpy.props.StringProperty(name = "Compare With", default = "",
+    description = "Snapshot to compare with. Leave empty to compare with the current UVs"
+  )
+
 # /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 class IMAGE_OP_Ultimate_Trim_Align(bpy.types.Operator):
     """Aligns selected UV Island(s) to given trim index"""
@@ -296,7 +563,9 @@ class IMAGE_OP_Ultimate_Trim_Align(bpy.types.Operator):
     def execute(self, context):
         props = context.scene.ut_uv_props
 
-        UltimateTrimAlign(props)
+        tiledPieces = UltimateTrimAlign(props)
+        if props.split_strips and props.split_layout == 'TRIMS' and tiledPieces > 0:
+            self.report({'WARNING'}, "%d strip piece(s) had no following trim of the same size and were tiled" % tiledPieces)
         
         return {'FINISHED'}
 
@@ -318,6 +587,205 @@ class IMAGE_OP_Ultimate_Edge_Align(bpy.types.Operator):
         
         return {'FINISHED'}
 
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Apply_Rules(bpy.types.Operator):
+    """Aligns all UV Islands of the mesh to the trims given by the rules table"""
+    bl_label = "Apply Rules"
+    bl_idname = "uv.trim_apply_rules"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'EDIT_MESH') and len(context.scene.ut_uv_props.rules) > 0
+        
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+
+        count, skipped = UltimateTrimApplyRules(props, context.edit_object)
+        if skipped:
+            self.report({'WARNING'}, "Aligned %d island(s), skipped rule(s) with a trim index outside their trim set: %s" % (count, ", ".join(skipped)))
+        else:
+            self.report({'INFO'}, "Aligned %d island(s)" % count)
+        
+        return {'FINISHED'}
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Rule_Add(bpy.types.Operator):
+    """Adds a trim rule"""
+    bl_label = "Add Rule"
+    bl_idname = "uv.trim_rule_add"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+
+        rule = props.rules.add()
+        rule.name = "Rule %d" % len(props.rules)
+        props.active_rule_index = len(props.rules) - 1
+
+        return {'FINISHED'}
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Rule_Remove(bpy.types.Operator):
+    """Removes the active trim rule"""
+    bl_label = "Remove Rule"
+    bl_idname = "uv.trim_rule_remove"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        props = context.scene.ut_uv_props
+        return 0 <= props.active_rule_index < len(props.rules)
+
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+
+        props.rules.remove(props.active_rule_index)
+        props.active_rule_index = max(0, min(props.active_rule_index, len(props.rules) - 1))
+
+        return {'FINISHED'}
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Audit(bpy.types.Operator, ExportHelper):
+    """Writes the trim usage, stray islands and texel densities of all meshes in the file to a JSON report"""
+    bl_label = "Trim Usage Audit"
+    bl_idname = "uv.trim_audit"
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'OBJECT')
+
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+
+        report = UltimateTrimAudit(props, bpy.data.objects)
+        with open(self.filepath, 'w') as file:
+            json.dump(report, file, indent=2)
+
+        self.report({'INFO'}, "Audited %d mesh(es), rescanned %d, %d stray island(s)" % (report["meshes"], report["rescanned"], len(report["stray"])))
+
+        return {'FINISHED'}
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Snapshot_Save(bpy.types.Operator):
+    """Stores the active UV map, island labels and trim assignments in a snapshot next to the .blend file"""
+    bl_label = "Save Snapshot"
+    bl_idname = "uv.trim_snapshot_save"
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and context.mode in {'OBJECT', 'EDIT_MESH'}
+
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+        obj = context.active_object
+
+        if obj.data.uv_layers.active is None:
+            self.report({'ERROR'}, "%s has no UV map" % obj.name)
+            return {'CANCELLED'}
+
+        path = snapshot.SaveSnapshot(obj, props.snapshot_name, props, trimSets[props.trim_set])
+        if path is None:
+            self.report({'ERROR'}, "Save the .blend file before taking snapshots")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "Saved snapshot to %s" % path)
+
+        return {'FINISHED'}
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Snapshot_Restore(bpy.types.Operator):
+    """Writes the UVs of a snapshot back to the active mesh"""
+    bl_label = "Restore Snapshot"
+    bl_idname = "uv.trim_snapshot_restore"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and context.mode in {'OBJECT', 'EDIT_MESH'}
+
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+
+        if not snapshot.RestoreSnapshot(context.active_object, props.snapshot_name):
+            self.report({'ERROR'}, "Snapshot '%s' is missing or does not match the mesh" % props.snapshot_name)
+            return {'CANCELLED'}
+
+        return {'FINISHED'}
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Snapshot_Diff(bpy.types.Operator):
+    """Selects the UV Islands that differ between a snapshot and the current UVs or a second snapshot"""
+    bl_label = "Diff Snapshot"
+    bl_idname = "uv.trim_snapshot_diff"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and context.mode in {'OBJECT', 'EDIT_MESH'}
+
+    def execute(self, context):
+        props = context.scene.ut_uv_props
+
+        count = snapshot.DiffSnapshot(context.active_object, props.snapshot_name, props.snapshot_compare)
+        if count is None:
+            self.report({'ERROR'}, "Snapshot is missing or does not match the mesh")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "%d island(s) changed" % count)
+
+        return {'FINISHED'}
+
+def menu_func_audit(self, context):
+    self.layout.operator(IMAGE_OP_Ultimate_Trim_Audit.bl_idname, text="Trim Usage Audit (.json)")
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_OP_Ultimate_Trim_Propagate_LODs(bpy.types.Operator):
+    """Copies the trim alignment of the active mesh onto the selected LOD meshes by matching islands in 3D"""
+    bl_label = "Propagate Trims to LODs"
+    bl_idname = "uv.trim_propagate_lods"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    normal_threshold: bpy.props.FloatProperty(name = "Normal Threshold", default = 0.5, min = -1.0, max = 1.0,
+      description = "Minimum dot product between the normals of matched islands"
+    )
+    use_world_space: bpy.props.BoolProperty(name = "World Space", default = False,
+      description = "Match islands in world space instead of object space, for LODs that are placed apart"
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return (context.mode == 'OBJECT') and obj is not None and obj.type == 'MESH' and \
+            any(other.type == 'MESH' and other != obj for other in context.selected_objects)
+
+    def execute(self, context):
+        source = context.active_object
+        lods = [obj for obj in context.selected_objects if obj.type == 'MESH' and obj != source and obj.data != source.data]
+
+        for obj in [source] + lods:
+            if obj.data.uv_layers.active is None:
+                self.report({'ERROR'}, "%s has no UV map" % obj.name)
+                return {'CANCELLED'}
+
+        if len(source.data.polygons) == 0:
+            self.report({'ERROR'}, "%s has no faces" % source.name)
+            return {'CANCELLED'}
+
+        count = lod.PropagateLODs(source, lods, self.normal_threshold, self.use_world_space, context.scene.ut_uv_props)
+        self.report({'INFO'}, "Matched %d island(s) on %d LOD(s)" % (count, len(lods)))
+
+        return {'FINISHED'}
+
+def menu_func_lods(self, context):
+    self.layout.operator(IMAGE_OP_Ultimate_Trim_Propagate_LODs.bl_idname)
+
 # /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 class IMAGE_PT_Ultimate_Trim_UV(bpy.types.Panel):
     bl_label = "Ultimate Trim UV"
@@ -340,30 +808,118 @@ class IMAGE_PT_Ultimate_Trim_UV(bpy.types.Panel):
         layout.prop(props, "uv_padding", text="UV Padding")
         layout.prop(props, "trim_index", text="Trim Index")
         layout.prop(props, "trim_variants", text="Variants")
+        layout.prop(props, "assign_mode", text="Assignment")
+        layout.prop(props, "trim_capacity", text="Trim Capacity")
         layout.prop(props, "h_align", text="H Align")
         layout.prop(props, "v_align", text="V Align")
         layout.prop(props, "scale", text="Scale")
         layout.prop(props, "size_x", text="Size X")
         layout.prop(props, "size_y", text="Size Y")
+        layout.prop(props, "texel_snap", text="Texel Snap")
+        layout.prop(props, "texel_target", text="Snap Target")
+        layout.prop(props, "split_strips", text="Split Strips")
+        layout.prop(props, "split_layout", text="Split Layout")
+        layout.prop(props, "reuse_duplicates", text="Reuse Duplicates")
         layout.operator("uv.trim_align")
         layout.operator("uv.edge_align")
 
-classes = {
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_PT_Ultimate_Trim_Rules(bpy.types.Panel):
+    bl_label = "Trim Rules"
+    bl_space_type = 'IMAGE_EDITOR'
+    bl_region_type = 'UI'
+    bl_category = "Ultimate Trim UV"
+    
+    @classmethod
+    def poll(cls, context):
+        sima = context.space_data
+        return sima.show_uvedit and \
+            not context.scene.tool_settings.use_uv_select_sync
+
+    def draw(self, context):
+        props = context.scene.ut_uv_props
+        layout = self.layout
+
+        row = layout.row()
+        row.template_list("UI_UL_list", "ut_trim_rules", props, "rules", props, "active_rule_index")
+        col = row.column(align=True)
+        col.operator("uv.trim_rule_add", icon='ADD', text="")
+        col.operator("uv.trim_rule_remove", icon='REMOVE', text="")
+
+        if 0 <= props.active_rule_index < len(props.rules):
+            rule = props.rules[props.active_rule_index]
+            layout.prop(rule, "enabled", text="Enabled")
+            layout.prop(rule, "source", text="Source")
+            if rule.source == 'MATERIAL':
+                layout.prop(rule, "material", text="Material")
+            else:
+                layout.prop(rule, "attribute_name", text="Attribute")
+                layout.prop(rule, "attribute_value", text="Value")
+            layout.prop(rule, "trim_set", text="Trim Set")
+            layout.prop(rule, "trim_index", text="Trim Index")
+            layout.prop(rule, "trim_variants", text="Variants")
+            layout.prop(rule, "h_align", text="H Align")
+            layout.prop(rule, "v_align", text="V Align")
+            layout.prop(rule, "scale", text="Scale")
+
+        layout.operator("uv.trim_apply_rules")
+
+# /////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+class IMAGE_PT_Ultimate_Trim_Snapshots(bpy.types.Panel):
+    bl_label = "UV Snapshots"
+    bl_space_type = 'IMAGE_EDITOR'
+    bl_region_type = 'UI'
+    bl_category = "Ultimate Trim UV"
+    
+    @classmethod
+    def poll(cls, context):
+        sima = context.space_data
+        return sima.show_uvedit and \
+            not context.scene.tool_settings.use_uv_select_sync
+
+    def draw(self, context):
+        props = context.scene.ut_uv_props
+        layout = self.layout
+
+        layout.prop(props, "snapshot_name", text="Snapshot")
+        layout.prop(props, "snapshot_compare", text="Compare With")
+        layout.operator("uv.trim_snapshot_save")
+        layout.operator("uv.trim_snapshot_restore")
+        layout.operator("uv.trim_snapshot_diff")
+
+# Registration order matters, property groups must be registered before the groups referencing them
+classes = (
+  UltimateTrimRule,
   UltimateTrimUVProps,
   IMAGE_OP_Ultimate_Trim_Align,
   IMAGE_OP_Ultimate_Edge_Align,
-  IMAGE_PT_Ultimate_Trim_UV
-}
+  IMAGE_OP_Ultimate_Trim_Apply_Rules,
+  IMAGE_OP_Ultimate_Trim_Rule_Add,
+  IMAGE_OP_Ultimate_Trim_Rule_Remove,
+  IMAGE_OP_Ultimate_Trim_Snapshot_Save,
+  IMAGE_OP_Ultimate_Trim_Snapshot_Restore,
+  IMAGE_OP_Ultimate_Trim_Snapshot_Diff,
+  IMAGE_OP_Ultimate_Trim_Audit,
+  IMAGE_OP_Ultimate_Trim_Propagate_LODs,
+  IMAGE_PT_Ultimate_Trim_UV,
+  IMAGE_PT_Ultimate_Trim_Rules,
+  IMAGE_PT_Ultimate_Trim_Snapshots
+)
 
 def register():
     for c in classes:
         bpy.utils.register_class(c)
 
     bpy.types.Scene.ut_uv_props = bpy.props.PointerProperty(type=UltimateTrimUVProps)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_audit)
+    bpy.types.VIEW3D_MT_object.append(menu_func_lods)
     AdjustTrimDefs()
 
 def unregister():
-    for c in classes:
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_audit)
+    bpy.types.VIEW3D_MT_object.remove(menu_func_lods)
+
+    for c in reversed(classes):
         bpy.utils.unregister_class(c)
     
     del bpy.types.Scene.ut_uv_props
@@ -0,0 +1,161 @@
+"""Trim assignment module.
+
+Assigns a whole selection of islands to trims at once by minimizing the
+total cost of an islands x trims cost matrix.
+"""
+import numpy as np
+
+# weights of the individual error terms of the cost matrix
+ASPECT_WEIGHT = 1.0
+SIZE_WEIGHT = 2.0
+DENSITY_WEIGHT = 0.5
+
+
+def CostMatrix(sizes, trimDefs, variants, scale, padding):
+    """Return the cost of placing every island on every trim.
+
+    The cost combines the aspect ratio mismatch, the amount the scaled
+    island overflows the trim and the texel density change caused by the
+    fit scale. Trims excluded by 'variants' get an infinite cost.
+
+    :param sizes: width and height of every island.
+    :type sizes: list
+    :param trimDefs: the trims of the current trim set.
+    :type trimDefs: list
+    :param variants: the allowed variant or 'ALL'.
+    :type variants: str
+    :param scale: the scale mode used for aligning.
+    :type scale: str
+    :param padding: padding in UV space applied on each side of a trim.
+    :type padding: float
+    :return: islands x trims cost matrix.
+    :rtype: :class:`numpy.ndarray`
+    """
+    sizes = np.maximum(np.asarray(sizes, dtype=np.float64).reshape(-1, 2), 1.0e-8)
+    trims = np.array([(trim.width, trim.height) for trim in trimDefs], dtype=np.float64)
+    trims = np.maximum(trims - 2.0 * padding, 1.0e-8)
+
+    width = sizes[:, 0, None]
+    height = sizes[:, 1, None]
+    trimWidth = trims[None, :, 0]
+    trimHeight = trims[None, :, 1]
+
+    if scale == 'FIT_X':
+        fit = trimWidth / width
+    elif scale == 'FIT_Y':
+        fit = trimHeight / height
+    else:
+        fit = np.minimum(trimWidth / width, trimHeight / height)
+
+    aspect = np.abs(np.log((width / height) / (trimWidth / trimHeight)))
+    overflow = np.maximum(np.log(width * fit / trimWidth), 0.0) + \
+        np.maximum(np.log(height * fit / trimHeight), 0.0)
+    density = np.abs(np.log(fit))
+
+    cost = ASPECT_WEIGHT * aspect + SIZE_WEIGHT * overflow + DENSITY_WEIGHT * density
+
+    if variants != 'ALL':
+        excluded = np.array([trim.variant != variants for trim in trimDefs])
+        cost[:, excluded] = np.inf
+
+    return cost
+
+
+def AssignTrims(cost, capacity=0):
+    """Assign every island (row) to a trim (column) at minimum total cost.
+
+    Without a capacity every island simply takes its cheapest trim. With a
+    capacity islands are inserted one at a time along the shortest
+    augmenting path, which may move already placed islands to other trims.
+    The paths run over the trims only, so each insertion costs
+    O(islands x trims). Islands that no longer fit anywhere fall back to
+    their cheapest trim.
+
+    :param cost: islands x trims cost matrix.
+    :type cost: :class:`numpy.ndarray`
+    :param capacity: maximum number of islands per trim, 0 for no limit.
+    :type capacity: int
+    :return: the trim index of every island.
+    :rtype: :class:`numpy.ndarray`
+    """
+    best = np.argmin(cost, axis=1)
+    allowed = np.isfinite(cost).any(axis=0)
+    if capacity <= 0 or not allowed.any():
+        return best
+
+    numIslands, numTrims = cost.shape
+    trimRange = np.arange(numTrims)
+    assigned = np.full(numIslands, -1)
+    load = np.zeros(numTrims, dtype=int)
+
+    for i in range(numIslands):
+        free = allowed & (load < capacity)
+
+        # the cheapest trim is optimal as long as it has room left
+        if not free.any() or free[best[i]]:
+            assigned[i] = best[i]
+            load[best[i]] += 1
+            continue
+
+        # cost of moving the cheapest placed island from one trim to another
+        placed = np.nonzero(assigned >= 0)[0]
+        placedTrims = assigned[placed]
+        delta = cost[placed] - cost[placed, placedTrims][:, None]
+
+        moveCost = np.full((numTrims, numTrims), np.inf)
+        moveIsland = np.zeros((numTrims, numTrims), dtype=int)
+        for trim in np.unique(placedTrims):
+            members = placedTrims == trim
+            rows = delta[members]
+            cheapest = np.argmin(rows, axis=0)
+            moveCost[trim] = rows[cheapest, trimRange]
+            moveIsland[trim] = placed[members][cheapest]
+        np.fill_diagonal(moveCost, np.inf)
+
+        # Bellman-Ford over the trims, starting from the island's own costs
+        dist = cost[i].copy()
+        parent = np.full(numTrims, -1)
+        for _ in range(numTrims):
+            via = dist[:, None] + moveCost
+            source = np.argmin(via, axis=0)
+            viaDist = via[source, trimRange]
+            relaxed = viaDist < dist - 1.0e-12
+            if not relaxed.any():
+                break
+            dist[relaxed] = viaDist[relaxed]
+            parent[relaxed] = source[relaxed]
+
+        trim = int(np.argmin(np.where(free, dist, np.inf)))
+        load[trim] += 1
+        while parent[trim] >= 0:
+            source = parent[trim]
+            assigned[moveIsland[source, trim]] = trim
+            trim = source
+        assigned[i] = trim
+
+    return assigned
+
+
+def NearestTrims(points, trimDefs, variants):
+    """Return the index of the trim closest to every point.
+
+    Array version of FindBestMatch for many points at once.
+
+    :param points: (n, 2) UV positions.
+    :type points: :class:`numpy.ndarray`
+    :param trimDefs: the trims of the current trim set.
+    :type trimDefs: list
+    :param variants: the allowed variant or 'ALL'.
+    :type variants: str
+    :rtype: :class:`numpy.ndarray`
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+    lowest = np.array([(trim.x_offset, trim.y_offset - trim.height) for trim in trimDefs])
+    highest = np.array([(trim.x_offset + trim.width, trim.y_offset) for trim in trimDefs])
+
+    distance = np.linalg.norm(points - np.clip(points, lowest, highest), axis=2)
+    if variants != 'ALL':
+        excluded = np.array([trim.variant != variants for trim in trimDefs])
+        distance[:, excluded] = np.inf
+
+    return np.argmin(distance, axis=1)
@@ -0,0 +1,245 @@
+"""Trim usage audit module.
+
+Scans meshes for the trims their UV islands use. Results are cached in a
+.json file next to the .blend file, keyed by the mesh name and a hash of
+its UVs, topology and the audit settings, so only changed meshes are
+rescanned. The cache stays out of the mesh datablocks, so exporters never
+see it.
+"""
+import hashlib
+import json
+import math
+import os
+
+import bpy
+import numpy as np
+
+from . import global_def, make_islands
+
+# bump when the cached result layout changes
+CACHE_VERSION = 1
+
+# tolerance when testing whether an island lies inside its trim
+INSIDE_EPSILON = 1.0e-5
+
+
+def CachePath():
+    """Return the audit cache file of the current .blend file.
+
+    :return: the path or None while the .blend file is unsaved.
+    :rtype: str
+    """
+    if not bpy.data.filepath:
+        return None
+
+    return os.path.splitext(bpy.data.filepath)[0] + "_uv_audit.json"
+
+
+def ReadCache(path):
+    """Return the cached results by mesh name, empty when missing or unreadable."""
+    if path is None or not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("meshes", {})
+
+
+def WriteCache(path, meshes):
+    """Store the cached results by mesh name."""
+    if path is None:
+        return
+
+    with open(path, 'w') as file:
+        json.dump({"version": CACHE_VERSION, "meshes": meshes}, file)
+
+
+def MeshKey(mesh, props):
+    """Return a hash of the mesh UVs, topology and the audit settings.
+
+    :param mesh: the mesh to hash.
+    :type mesh: :class:`bpy.types.Mesh`
+    :param props: the add-on properties.
+    :rtype: str
+    """
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", uvs)
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loopVerts)
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+
+    digest = hashlib.sha1()
+    digest.update(("%d %s %s %s" % (CACHE_VERSION, props.trim_set, props.trim_res, props.trim_variants)).encode())
+    for array in (uvs, loopVerts, loopTotals, coords):
+        digest.update(array.tobytes())
+
+    return digest.hexdigest()
+
+
+def IslandDensity(island, res):
+    """Return the texel density of an island in pixels per mesh unit.
+
+    The density is measured in mesh space; :func:`AuditMeshes` divides it
+    by the scale of every object using the mesh.
+
+    :return: the density or None for islands without area.
+    :rtype: float
+    """
+    uvArea = 0.0
+    area = 0.0
+    for face_id in island:
+        face = global_def.bm.faces[face_id]
+        area += face.calc_area()
+
+        # faces may be mirrored in UV space, so each face adds its own absolute area
+        uvs = [loop[global_def.uvlayer].uv for loop in face.loops]
+        faceArea = 0.0
+        for i in range(len(uvs)):
+            faceArea += uvs[i - 1].x * uvs[i].y - uvs[i].x * uvs[i - 1].y
+        uvArea += abs(faceArea)
+
+    uvArea *= 0.5
+    if area <= 0.0 or uvArea <= 0.0:
+        return None
+
+    return math.sqrt(uvArea / area) * res
+
+
+def AuditMesh(mesh, props, trimDefs, findBestMatch):
+    """Scan a single mesh.
+
+    :param mesh: the mesh to scan.
+    :type mesh: :class:`bpy.types.Mesh`
+    :param props: the add-on properties.
+    :param trimDefs: the trims of the current trim set.
+    :type trimDefs: list
+    :param findBestMatch: returns the trim an island belongs to.
+    :return: island count, per-trim usage, island densities and stray islands.
+    :rtype: dict
+    """
+    res = float(props.trim_res)
+    trimIndices = {id(trimDef): index for index, trimDef in enumerate(trimDefs)}
+
+    result = {"islands": 0, "usage": [0] * len(trimDefs), "densities": [], "stray": []}
+
+    makeIslands = make_islands.MakeIslands(mesh)
+    for island in makeIslands.getIslands():
+        result["islands"] += 1
+        bbox = island.BBox()
+        trimDef = findBestMatch(island, props.trim_variants)
+
+        inside = bbox.left() >= trimDef.x_offset - INSIDE_EPSILON and \
+            bbox.right() <= trimDef.x_offset + trimDef.width + INSIDE_EPSILON and \
+            bbox.top() <= trimDef.y_offset + INSIDE_EPSILON and \
+            bbox.bottom() >= trimDef.y_offset - trimDef.height - INSIDE_EPSILON
+
+        if not inside:
+            center = bbox.center()
+            result["stray"].append({"faces": len(island), "center": [center.x, center.y]})
+            continue
+
+        trimIndex = trimIndices[id(trimDef)]
+        result["usage"][trimIndex] += 1
+
+        density = IslandDensity(island, res)
+        if density is not None:
+            result["densities"].append([trimIndex, density])
+
+    global_def.bm.free()
+    global_def.bm = None
+
+    return result
+
+
+def DensityStats(densities):
+    """Return min, max, mean and median of a list of densities."""
+    if len(densities) == 0:
+        return None
+
+    densities = np.asarray(densities, dtype=np.float64)
+    return {
+        "min": float(densities.min()),
+        "max": float(densities.max()),
+        "mean": float(densities.mean()),
+        "median": float(np.median(densities))
+    }
+
+
+def AuditMeshes(meshInstances, props, trimDefs, findBestMatch):
+    """Audit meshes, reusing cached results of unchanged meshes.
+
+    :param meshInstances: scale of every object using each mesh, the cube
+        root of the absolute determinant of its world matrix.
+    :type meshInstances: dict
+    :param props: the add-on properties.
+    :param trimDefs: the trims of the current trim set.
+    :type trimDefs: list
+    :param findBestMatch: returns the trim an island belongs to.
+    :return: the audit report.
+    :rtype: dict
+    """
+    usage = np.zeros(len(trimDefs), dtype=np.int64)
+    meshUsage = np.zeros(len(trimDefs), dtype=np.int64)
+    densities = [[] for _ in trimDefs]
+    stray = []
+    rescanned = 0
+
+    cachePath = CachePath()
+    cache = ReadCache(cachePath)
+
+    for mesh, scales in meshInstances.items():
+        instances = len(scales)
+        if mesh.uv_layers.active is None:
+            continue
+
+        key = MeshKey(mesh, props)
+        cached = cache.get(mesh.name_full)
+        if cached is not None and cached.get("key") == key:
+            result = cached["result"]
+        else:
+            result = AuditMesh(mesh, props, trimDefs, findBestMatch)
+            rescanned += 1
+            cache[mesh.name_full] = {"key": key, "result": result}
+
+        meshTrimUsage = np.asarray(result["usage"], dtype=np.int64)
+        usage += meshTrimUsage * instances
+        meshUsage += meshTrimUsage > 0
+        for trimIndex, density in result["densities"]:
+            densities[trimIndex].extend(density / scale for scale in scales if scale > 0.0)
+        for island in result["stray"]:
+            stray.append(dict(island, mesh=mesh.name_full, instances=instances))
+
+    if rescanned:
+        WriteCache(cachePath, cache)
+
+    trims = []
+    for index, trimDef in enumerate(trimDefs):
+        trims.append({
+            "index": index,
+            "variant": trimDef.variant,
+            "width": trimDef.width,
+            "height": trimDef.height,
+            "islands": int(usage[index]),
+            "meshes": int(meshUsage[index]),
+            "texel_density": DensityStats(densities[index])
+        })
+
+    return {
+        "trim_set": props.trim_set,
+        "trim_res": int(props.trim_res),
+        "meshes": len(meshInstances),
+        "rescanned": rescanned,
+        "trims": trims,
+        "unused_trims": [trim["index"] for trim in trims if trim["islands"] == 0],
+        "stray": stray,
+        "texel_density": DensityStats([density for trimDensities in densities for density in trimDensities])
+    }
@@ -0,0 +1,108 @@
+"""Headless batch processing.
+
+Run Blender in background mode and call :func:`main`, passing the options
+after '--', e.g.::
+
+    blender -b asset.blend --python-expr "import UltimateTrimUV.batch as b; b.main()" -- --rules --save
+    blender -b level.blend --python-expr "import UltimateTrimUV.batch as b; b.main()" -- --audit audit.json --save
+    blender -b asset.blend --python-expr "import UltimateTrimUV.batch as b; b.main()" -- --snapshot before --rules --save
+
+The audit cache is kept in a '<blend>_uv_audit.json' file next to the .blend
+file, so repeated audits only rescan changed meshes.
+"""
+import argparse
+import json
+import sys
+
+import bpy
+
+from . import UltimateTrimApplyRules, UltimateTrimAudit, register, snapshot, trimSets
+
+
+def EditMeshes(objects):
+    """Enter edit mode on each mesh object in turn.
+
+    :param objects: the objects to visit.
+    :type objects: list
+    :return: yields every mesh object while it is in edit mode.
+    """
+    viewLayer = bpy.context.view_layer
+    for obj in objects:
+        if obj.type != 'MESH' or not obj.visible_get():
+            continue
+
+        if bpy.context.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        for other in viewLayer.objects:
+            other.select_set(False)
+        obj.select_set(True)
+        viewLayer.objects.active = obj
+
+        bpy.ops.object.mode_set(mode='EDIT')
+        yield obj
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+
+def ApplyRules(objects, props):
+    """Apply the trim rules to every mesh in 'objects'.
+
+    :return: the number of aligned islands and the names of the rules
+        skipped for a trim index outside their trim set.
+    :rtype: tuple
+    """
+    count = 0
+    skipped = set()
+    for obj in EditMeshes(objects):
+        objCount, objSkipped = UltimateTrimApplyRules(props, obj)
+        count += objCount
+        skipped.update(objSkipped)
+    return count, sorted(skipped)
+
+
+def main(argv=None):
+    """Parse the command line and run the requested batch operations."""
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(prog="UltimateTrimUV.batch")
+    parser.add_argument("--rules", action="store_true", help="apply the scene's trim rules to all meshes")
+    parser.add_argument("--restore", metavar="NAME", help="restore UV snapshot NAME on all meshes before anything else")
+    parser.add_argument("--snapshot", metavar="NAME", help="store UV snapshot NAME of all meshes before applying rules")
+    parser.add_argument("--audit", metavar="PATH", help="write a trim usage audit of all meshes to a JSON file")
+    parser.add_argument("--save", action="store_true", help="save the .blend file afterwards")
+    args = parser.parse_args(argv)
+
+    if not hasattr(bpy.types.Scene, "ut_uv_props"):
+        register()
+
+    scene = bpy.context.scene
+    props = scene.ut_uv_props
+
+    meshObjects = [obj for obj in scene.objects if obj.type == 'MESH' and obj.data.uv_layers.active is not None]
+
+    if args.restore:
+        restored = sum(snapshot.RestoreSnapshot(obj, args.restore) for obj in meshObjects)
+        print("UltimateTrimUV: restored snapshot '%s' on %d mesh(es)" % (args.restore, restored))
+
+    if args.snapshot:
+        for obj in meshObjects:
+            if snapshot.SaveSnapshot(obj, args.snapshot, props, trimSets[props.trim_set]) is None:
+                print("UltimateTrimUV: save the .blend file before taking snapshots")
+                break
+
+    if args.rules:
+        count, skipped = ApplyRules(list(scene.objects), props)
+        print("UltimateTrimUV: aligned %d island(s)" % count)
+        if skipped:
+            print("UltimateTrimUV: skipped rule(s) with a trim index outside their trim set: %s" % ", ".join(skipped))
+
+    if args.audit:
+        if bpy.context.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        report = UltimateTrimAudit(props, bpy.data.objects)
+        with open(args.audit, 'w') as file:
+            json.dump(report, file, indent=2)
+        print("UltimateTrimUV: audited %d mesh(es), rescanned %d" % (report["meshes"], report["rescanned"]))
+
+    if args.save:
+        bpy.ops.wm.save_mainfile()
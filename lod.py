@@ -0,0 +1,231 @@
+"""LOD propagation module.
+
+Copies the trim alignment of a source mesh onto its LOD meshes by
+matching UV islands through their 3D position and orientation.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import global_def, make_islands, utils
+
+
+class IslandData:
+    """Per-loop and per-island arrays of a mesh.
+
+    :param mesh: the mesh to read, in object mode.
+    :type mesh: :class:`bpy.types.Mesh`
+    :param matrix: optional 4x4 matrix applied to positions and normals.
+    :type matrix: :class:`mathutils.Matrix`
+    """
+
+    def __init__(self, mesh, matrix=None):
+        islands = make_islands.MakeIslands(mesh).getIslands()
+        global_def.bm.free()
+        global_def.bm = None
+
+        numFaces = len(mesh.polygons)
+        numLoops = len(mesh.loops)
+
+        faceLabels = np.zeros(numFaces, dtype=np.int32)
+        for index, island in enumerate(islands):
+            faceLabels[list(island)] = index
+
+        centers = np.empty(numFaces * 3, dtype=np.float64)
+        normals = np.empty(numFaces * 3, dtype=np.float64)
+        areas = np.empty(numFaces, dtype=np.float64)
+        mesh.polygons.foreach_get("center", centers)
+        mesh.polygons.foreach_get("normal", normals)
+        mesh.polygons.foreach_get("area", areas)
+        centers = centers.reshape(-1, 3)
+        normals = normals.reshape(-1, 3)
+
+        if matrix is not None:
+            matrix = np.array(matrix, dtype=np.float64)
+            centers = centers @ matrix[:3, :3].T + matrix[:3, 3]
+            normals = normals @ np.linalg.inv(matrix[:3, :3])
+
+        self.loopFaces = utils.LoopFaces(mesh)
+        self.loopLabels = faceLabels[self.loopFaces]
+
+        self.uvs = np.empty(numLoops * 2, dtype=np.float32)
+        mesh.uv_layers.active.data.foreach_get("uv", self.uvs)
+        self.uvs = self.uvs.reshape(-1, 2)
+
+        # area weighted centroid and normal of every island
+        count = len(islands)
+        self.areas = np.bincount(faceLabels, weights=areas, minlength=count)
+        weights = np.maximum(self.areas, 1.0e-12)[:, None]
+        self.centroids = np.stack([np.bincount(faceLabels, weights=areas * centers[:, axis], minlength=count)
+                                   for axis in range(3)], axis=1) / weights
+        self.normals = np.stack([np.bincount(faceLabels, weights=areas * normals[:, axis], minlength=count)
+                                 for axis in range(3)], axis=1)
+        self.normals /= np.maximum(np.linalg.norm(self.normals, axis=1), 1.0e-12)[:, None]
+
+        self.uvMin = np.full((count, 2), np.inf)
+        self.uvMax = np.full((count, 2), -np.inf)
+        np.minimum.at(self.uvMin, self.loopLabels, self.uvs)
+        np.maximum.at(self.uvMax, self.loopLabels, self.uvs)
+
+    def __len__(self):
+        """Return the number of islands."""
+        return len(self.centroids)
+
+
+def ClosestCompatible(source, target, pairTargets, pairSources, minNormalDot, matches):
+    """Store the closest compatible source island of every target in 'matches'.
+
+    :param pairTargets: target island of every candidate pair.
+    :param pairSources: source island of every candidate pair.
+    """
+    dots = np.einsum('ij,ij->i', source.normals[pairSources], target.normals[pairTargets])
+    compatible = dots >= minNormalDot
+    pairTargets = pairTargets[compatible]
+    pairSources = pairSources[compatible]
+
+    distances = np.linalg.norm(source.centroids[pairSources] - target.centroids[pairTargets], axis=1)
+    order = np.lexsort((distances, pairTargets))
+    pairTargets = pairTargets[order]
+    pairSources = pairSources[order]
+
+    closest = np.ones(len(pairTargets), dtype=bool)
+    closest[1:] = pairTargets[1:] != pairTargets[:-1]
+    matches[pairTargets[closest]] = pairSources[closest]
+
+
+def MatchIslands(source, target, minNormalDot):
+    """Return the matching source island of every target island.
+
+    Source islands are bucketed in a spatial hash over their centroids:
+    cell keys are sorted once and the 27 cells around every target are
+    looked up with searchsorted. A target island takes the closest source
+    island in those cells whose normal is within 'minNormalDot'. Islands
+    without a candidate nearby fall back to a search over all source
+    islands. Everything runs as array operations.
+
+    :param source: the aligned mesh.
+    :type source: :class:`IslandData`
+    :param target: the LOD mesh.
+    :type target: :class:`IslandData`
+    :param minNormalDot: minimum dot product of matched island normals.
+    :type minNormalDot: float
+    :return: source island index per target island, -1 when unmatched.
+    :rtype: :class:`numpy.ndarray`
+    """
+    matches = np.full(len(target), -1, dtype=np.int64)
+    if len(source) == 0 or len(target) == 0:
+        return matches
+
+    cellSize = max(2.0 * float(np.median(np.sqrt(source.areas))), 1.0e-6)
+    sourceCells = np.floor(source.centroids / cellSize).astype(np.int64)
+    targetCells = np.floor(target.centroids / cellSize).astype(np.int64)
+
+    # one integer key per cell, with a border of one cell around all centroids
+    origin = np.minimum(sourceCells.min(axis=0), targetCells.min(axis=0)) - 1
+    dims = np.maximum(sourceCells.max(axis=0), targetCells.max(axis=0)) - origin + 2
+
+    def CellKeys(cells):
+        cells = cells - origin
+        return (cells[..., 0] * dims[1] + cells[..., 1]) * dims[2] + cells[..., 2]
+
+    sourceOrder = np.argsort(CellKeys(sourceCells), kind='stable')
+    sortedKeys = CellKeys(sourceCells)[sourceOrder]
+
+    neighbours = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)])
+    neighbourKeys = CellKeys(targetCells[:, None, :] + neighbours[None, :, :]).ravel()
+    starts = np.searchsorted(sortedKeys, neighbourKeys, side='left')
+    counts = np.searchsorted(sortedKeys, neighbourKeys, side='right') - starts
+
+    pairTargets = np.repeat(np.repeat(np.arange(len(target)), len(neighbours)), counts)
+    firstPair = np.repeat(np.cumsum(counts) - counts, counts)
+    pairSources = sourceOrder[np.repeat(starts, counts) + np.arange(len(pairTargets)) - firstPair]
+    ClosestCompatible(source, target, pairTargets, pairSources, minNormalDot, matches)
+
+    # brute force for the rest, in chunks to bound memory
+    unmatched = np.nonzero(matches < 0)[0]
+    chunkSize = max(1, 4000000 // len(source))
+    for start in range(0, len(unmatched), chunkSize):
+        chunk = unmatched[start:start + chunkSize]
+        ClosestCompatible(source, target, np.repeat(chunk, len(source)),
+                          np.tile(np.arange(len(source)), len(chunk)), minNormalDot, matches)
+
+    return matches
+
+
+def PropagateUVs(source, target, minNormalDot, props):
+    """Return the target UVs with every island placed like its source island.
+
+    Each matched LOD island gets the scale the source island was fitted
+    with: uniform from the width for FIT_X / SET_X, from the height for
+    FIT_Y / SET_Y, per axis only for FIT_BOTH / SET_XY, and from the area
+    otherwise. It is then anchored on the edge or center the source island
+    was aligned to, so it lands on the same trim with the same texel
+    density. Unmatched islands keep their UVs, all of them when the source
+    has no faces.
+
+    :return: the new UVs and the number of matched islands.
+    :rtype: tuple
+    """
+    if len(source) == 0:
+        return target.uvs.copy(), 0
+
+    matches = MatchIslands(source, target, minNormalDot)
+    matched = matches >= 0
+    safeMatches = np.where(matched, matches, 0)
+
+    targetSize = np.maximum(target.uvMax - target.uvMin, 1.0e-12)
+    sourceSize = source.uvMax[safeMatches] - source.uvMin[safeMatches]
+    ratio = sourceSize / targetSize
+
+    if props.scale in {'FIT_X', 'SET_X'}:
+        scale = np.repeat(ratio[:, 0, None], 2, axis=1)
+    elif props.scale in {'FIT_Y', 'SET_Y'}:
+        scale = np.repeat(ratio[:, 1, None], 2, axis=1)
+    elif props.scale in {'FIT_BOTH', 'SET_XY'}:
+        scale = ratio
+    else:
+        scale = np.repeat(np.sqrt(ratio[:, 0] * ratio[:, 1])[:, None], 2, axis=1)
+    scale[~matched] = 1.0
+
+    # relative position of the aligned edge inside the island bounds
+    anchor = np.array([
+        {'LEFT': 0.0, 'RIGHT': 1.0}.get(props.h_align, 0.5),
+        {'BOTTOM': 0.0, 'TOP': 1.0}.get(props.v_align, 0.5)])
+    targetAnchor = target.uvMin + anchor * (target.uvMax - target.uvMin)
+    sourceAnchor = source.uvMin[safeMatches] + anchor * sourceSize
+    sourceAnchor[~matched] = targetAnchor[~matched]
+
+    labels = target.loopLabels
+    uvs = (target.uvs - targetAnchor[labels]) * scale[labels] + sourceAnchor[labels]
+    return uvs.astype(np.float32), int(matched.sum())
+
+
+def PropagateLODs(sourceObject, lodObjects, minNormalDot, useWorldSpace, props):
+    """Place the islands of every LOD object like those of the aligned source object.
+
+    'props' gives the scale and alignment the source was aligned with.
+
+    Island detection and the mesh reads and writes touch bpy data and run
+    on the calling thread. The matching and UV remapping of every LOD are
+    pure array operations, which release the GIL, and run in a thread
+    pool, one LOD per worker.
+
+    :return: the number of matched islands.
+    :rtype: int
+    """
+    def Read(obj):
+        return IslandData(obj.data, obj.matrix_world if useWorldSpace else None)
+
+    source = Read(sourceObject)
+    targets = [Read(obj) for obj in lodObjects]
+
+    with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as executor:
+        results = list(executor.map(lambda target: PropagateUVs(source, target, minNormalDot, props), targets))
+
+    count = 0
+    for obj, (uvs, matched) in zip(lodObjects, results):
+        obj.data.uv_layers.active.data.foreach_set("uv", uvs.ravel())
+        obj.data.update()
+        count += matched
+
+    return count
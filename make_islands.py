@@ -27,9 +27,13 @@ class MakeIslands:
     Scan the current edit mesh for uv islands.
     """
 
-    def __init__(self):
-        """Scan the uv data and create the islands."""
-        utils.InitBMesh()
+    def __init__(self, mesh=None):
+        """Scan the uv data and create the islands.
+
+        :param mesh: scan this mesh instead of the edit mesh.
+        :type mesh: :class:`bpy.types.Mesh`
+        """
+        utils.InitBMesh(mesh)
         self.__islands = []
         self.__bm = global_def.bm
         self.__uvlayer = global_def.uvlayer
@@ -0,0 +1,72 @@
+"""Texel snapping module.
+
+Snaps aligned islands to the texel grid of the trim resolution.
+"""
+import numpy as np
+
+from . import utils
+
+
+def SnapValues(values, res, target, mode='ROUND'):
+    """Snap UV coordinates to the texel grid.
+
+    :param values: UV coordinates.
+    :type values: float or :class:`numpy.ndarray`
+    :param res: texture resolution in pixels.
+    :type res: float
+    :param target: 'EDGE' to snap to texel edges, 'CENTER' for texel centers.
+    :type target: str
+    :param mode: 'ROUND', 'FLOOR' or 'CEIL'.
+    :type mode: str
+    :return: the snapped coordinates.
+    """
+    offset = 0.5 if target == 'CENTER' else 0.0
+    rounding = {'ROUND': np.round, 'FLOOR': np.floor, 'CEIL': np.ceil}[mode]
+    return (rounding(np.asarray(values) * res - offset) + offset) / res
+
+
+def SnapSize(size, res):
+    """Round a length to whole texels, keeping at least one texel.
+
+    :param size: length in UV space.
+    :type size: float
+    :param res: texture resolution in pixels.
+    :type res: float
+    :rtype: float
+    """
+    return max(round(size * res), 1) / res
+
+
+def SnapIslands(islands, props):
+    """Snap the islands' bounds or vertices to the texel grid.
+
+    All loops of all islands are processed at once. In 'BOUNDS' mode every
+    island is moved so the bbox edge it was aligned with lands on the grid,
+    in 'VERTICES' mode every UV is rounded to the grid.
+
+    :param islands: the islands to snap.
+    :type islands: list
+    :param props: the add-on properties.
+    """
+    res = float(props.trim_res)
+    loops, labels = utils.IslandLoops(islands)
+    if not loops:
+        return
+
+    uvs = utils.GetUVs(loops)
+
+    if props.texel_snap == 'VERTICES':
+        uvs = SnapValues(uvs, res, props.texel_target)
+    else:
+        lowest, highest = utils.IslandBounds(uvs, labels, len(islands))
+
+        anchor = lowest
+        if props.h_align == 'RIGHT':
+            anchor[:, 0] = highest[:, 0]
+        if props.v_align == 'TOP':
+            anchor[:, 1] = highest[:, 1]
+
+        shift = SnapValues(anchor, res, props.texel_target) - anchor
+        uvs += shift[labels]
+
+    utils.SetUVs(loops, uvs)
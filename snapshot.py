@@ -0,0 +1,248 @@
+"""UV snapshot module.
+
+Stores the active UV layer of a mesh together with its island labels and
+trim assignments in memory-mapped .npy files next to the .blend file, so
+UV states can be compared and restored without walking the undo stack.
+A .json file beside each snapshot records a digest of the mesh topology
+and the trim set the trim assignments refer to.
+"""
+import hashlib
+import json
+import os
+import re
+
+import bmesh
+import bpy
+import numpy as np
+
+from . import assign, utils
+
+# one record per mesh loop
+SNAPSHOT_DTYPE = np.dtype([('uv', np.float32, (2,)), ('island', np.int32), ('trim', np.int16)])
+
+# UVs closer than this are considered unchanged
+DIFF_EPSILON = 1.0e-6
+
+
+def SnapshotPath(obj, name):
+    """Return the file of snapshot 'name' of 'obj'.
+
+    :return: the path or None while the .blend file is unsaved.
+    :rtype: str
+    """
+    if not bpy.data.filepath:
+        return None
+
+    directory = os.path.splitext(bpy.data.filepath)[0] + "_uv_snapshots"
+    safeName = lambda text: re.sub(r'[^\w\-.]', '_', text)
+    return os.path.join(directory, "%s.%s.npy" % (safeName(obj.name), safeName(name)))
+
+
+def HeaderPath(path):
+    """Return the .json header file of the snapshot at 'path'."""
+    return os.path.splitext(path)[0] + ".json"
+
+
+def TopologyKey(mesh):
+    """Return a hash of the loop vertices and face sizes of 'mesh'.
+
+    :rtype: str
+    """
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loopVerts)
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+
+    digest = hashlib.sha1()
+    digest.update(loopVerts.tobytes())
+    digest.update(loopTotals.tobytes())
+    return digest.hexdigest()
+
+
+def ReadUVs(obj):
+    """Return the active UVs of 'obj' as a (n, 2) array."""
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+
+    mesh = obj.data
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", uvs)
+    return uvs.reshape(-1, 2)
+
+
+def WriteUVs(obj, uvs):
+    """Write a (n, 2) array to the active UVs of 'obj' in one bulk pass."""
+    editMode = obj.mode == 'EDIT'
+    if editMode:
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    obj.data.uv_layers.active.data.foreach_set("uv", np.ascontiguousarray(uvs, dtype=np.float32).ravel())
+    obj.data.update()
+
+    if editMode:
+        bpy.ops.object.mode_set(mode='EDIT')
+
+
+def SaveSnapshot(obj, name, props, trimDefs):
+    """Store the active UVs, island labels and trim assignments of 'obj'.
+
+    :return: the snapshot path or None while the .blend file is unsaved.
+    :rtype: str
+    """
+    path = SnapshotPath(obj, name)
+    if path is None:
+        return None
+
+    uvs = ReadUVs(obj)
+    labels, count = utils.LoopLabels(obj.data, uvs)
+    lowest, highest = utils.IslandBounds(uvs, labels, count)
+    islandTrims = assign.NearestTrims((lowest + highest) * 0.5, trimDefs, props.trim_variants)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store = np.lib.format.open_memmap(path, mode='w+', dtype=SNAPSHOT_DTYPE, shape=(len(uvs),))
+    store['uv'] = uvs
+    store['island'] = labels
+    store['trim'] = islandTrims[labels]
+    store.flush()
+    del store
+
+    with open(HeaderPath(path), 'w') as file:
+        json.dump({"topology": TopologyKey(obj.data), "trim_set": props.trim_set}, file)
+
+    return path
+
+
+def LoadHeader(obj, name):
+    """Return the header of snapshot 'name' of 'obj'.
+
+    :return: the topology digest and trim set, or None when missing.
+    :rtype: dict
+    """
+    path = SnapshotPath(obj, name)
+    if path is None or not os.path.exists(HeaderPath(path)):
+        return None
+
+    try:
+        with open(HeaderPath(path)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def LoadSnapshot(obj, name):
+    """Open snapshot 'name' of 'obj' memory-mapped.
+
+    :return: the snapshot records or None when missing or when the mesh
+        topology changed since the snapshot was taken.
+    :rtype: :class:`numpy.memmap`
+    """
+    path = SnapshotPath(obj, name)
+    if path is None or not os.path.exists(path):
+        return None
+
+    header = LoadHeader(obj, name)
+    if header is None or header.get("topology") != TopologyKey(obj.data):
+        return None
+
+    store = np.load(path, mmap_mode='r')
+    if len(store) != len(obj.data.loops):
+        return None
+
+    return store
+
+
+def RestoreSnapshot(obj, name):
+    """Write the UVs of snapshot 'name' back to 'obj'.
+
+    :return: False when the snapshot is missing or does not fit the mesh.
+    :rtype: bool
+    """
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+
+    store = LoadSnapshot(obj, name)
+    if store is None:
+        return False
+
+    WriteUVs(obj, store['uv'])
+    return True
+
+
+def ChangedIslands(store, uvs):
+    """Return the snapshot islands whose UVs differ from 'uvs'.
+
+    :param store: snapshot records.
+    :param uvs: (n, 2) UVs to compare with.
+    :return: per loop whether its island changed, and the changed island labels.
+    :rtype: tuple
+    """
+    changedLoops = np.any(np.abs(store['uv'] - uvs) > DIFF_EPSILON, axis=1)
+    changedIslands = np.unique(store['island'][changedLoops])
+    return np.isin(store['island'], changedIslands), changedIslands
+
+
+def SelectLoops(mesh, loopMask):
+    """Select the faces, edges and vertices of the masked loops of 'mesh'.
+
+    Everything else is deselected. 'mesh' must not be in edit mode.
+    """
+    loopFaces = utils.LoopFaces(mesh)
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    loopEdges = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loopVerts)
+    mesh.loops.foreach_get("edge_index", loopEdges)
+
+    faceSelect = np.zeros(len(mesh.polygons), dtype=bool)
+    faceSelect[loopFaces[loopMask]] = True
+    selectedLoops = faceSelect[loopFaces]
+
+    vertSelect = np.zeros(len(mesh.vertices), dtype=bool)
+    vertSelect[loopVerts[selectedLoops]] = True
+    edgeSelect = np.zeros(len(mesh.edges), dtype=bool)
+    edgeSelect[loopEdges[selectedLoops]] = True
+
+    mesh.polygons.foreach_set("select", faceSelect)
+    mesh.edges.foreach_set("select", edgeSelect)
+    mesh.vertices.foreach_set("select", vertSelect)
+    mesh.update()
+
+
+def DiffSnapshot(obj, name, compareName=None):
+    """Compare snapshot 'name' with snapshot 'compareName' or the current UVs.
+
+    The faces of changed islands are selected, in object mode by writing
+    the mesh selection flags.
+
+    :return: the number of changed islands, None when a snapshot is missing.
+    :rtype: int
+    """
+    uvs = ReadUVs(obj)
+    store = LoadSnapshot(obj, name)
+    if store is None:
+        return None
+
+    if compareName:
+        compare = LoadSnapshot(obj, compareName)
+        if compare is None:
+            return None
+        uvs = compare['uv']
+
+    loopMask, changedIslands = ChangedIslands(store, uvs)
+
+    if obj.mode == 'EDIT':
+        bpy.ops.mesh.select_all(action='DESELECT')
+
+        bm = bmesh.from_edit_mesh(obj.data)
+        bm.faces.ensure_lookup_table()
+        uvlayer = bm.loops.layers.uv.active
+        for face_id in np.unique(utils.LoopFaces(obj.data)[loopMask]).tolist():
+            face = bm.faces[face_id]
+            face.select_set(True)
+            for loop in face.loops:
+                loop[uvlayer].select = True
+
+        bmesh.update_edit_mesh(obj.data, loop_triangles=False, destructive=False)
+    else:
+        SelectLoops(obj.data, loopMask)
+
+    return len(changedIslands)
@@ -0,0 +1,136 @@
+"""Strip splitting module.
+
+Cuts islands that run past their trim into trim-length pieces along
+existing edge loops.
+"""
+import numpy as np
+
+from . import global_def, utils
+
+# tolerance when comparing trim sizes and cut positions
+EPSILON = 1.0e-6
+
+
+def CutPositions(candidates, start, end, length):
+    """Pick cut positions so every piece is at most 'length' long.
+
+    Each cut is the last candidate within 'length' of the previous cut. If
+    no candidate is in reach the next one further away is taken, leaving
+    that piece longer than 'length'.
+
+    :param candidates: sorted U positions of the edge loops.
+    :type candidates: :class:`numpy.ndarray`
+    :param start: U of the strip start.
+    :type start: float
+    :param end: U of the strip end.
+    :type end: float
+    :param length: maximum piece length.
+    :type length: float
+    :rtype: list
+    """
+    cuts = []
+    while end - start > length + EPSILON:
+        reach = np.searchsorted(candidates, start + length + EPSILON, side='right') - 1
+        if reach >= 0 and candidates[reach] > start + EPSILON:
+            cut = candidates[reach]
+        else:
+            further = np.searchsorted(candidates, start + EPSILON, side='right')
+            if further >= len(candidates):
+                break
+            cut = candidates[further]
+
+        if end - cut <= EPSILON:
+            break
+        cuts.append(float(cut))
+        start = cut
+
+    return cuts
+
+
+def SplitStrip(island, trimDef, trimDefs, left, right, layout):
+    """Split an island that is wider than its trim into trim-length pieces.
+
+    Cuts follow edge loops running across the strip, i.e. edges that are
+    more vertical than horizontal in UV space, and are marked as seams.
+    Every piece is moved to the left trim edge. With 'TRIMS' layout the
+    pieces go to the island's trim and the following trims of the same
+    size in the trim set. Pieces beyond the last such trim, and all pieces
+    with 'TILE' layout, stay on the island's trim. Pieces are only moved, so
+    the texel density stays continuous.
+
+    :param island: the aligned island.
+    :type island: :class:`.Island`
+    :param trimDef: the trim the island is aligned to.
+    :param trimDefs: the trims of the current trim set.
+    :type trimDefs: list
+    :param left: left edge of the usable trim area.
+    :type left: float
+    :param right: right edge of the usable trim area.
+    :type right: float
+    :param layout: 'TRIMS' or 'TILE'.
+    :type layout: str
+    :return: the number of pieces and how many of them had to be tiled
+        because the 'TRIMS' layout ran out of trims.
+    :rtype: tuple
+    """
+    faces = [global_def.bm.faces[face_id] for face_id in island]
+    loops = [loop for face in faces for loop in face.loops]
+    uvs = utils.GetUVs(loops)
+
+    # face of every loop and the index of the next loop around that face
+    faceSizes = np.array([len(face.loops) for face in faces], dtype=np.int64)
+    faceStarts = np.cumsum(faceSizes) - faceSizes
+    loopFaces = np.repeat(np.arange(len(faces)), faceSizes)
+    corner = np.arange(len(loops)) - faceStarts[loopFaces]
+    nextLoops = faceStarts[loopFaces] + (corner + 1) % faceSizes[loopFaces]
+
+    start = uvs[:, 0].min()
+    end = uvs[:, 0].max()
+    if end - start <= right - left + EPSILON:
+        return 1, 0
+
+    # edges crossing the strip and their cumulative U length from the strip start
+    edges = uvs[nextLoops] - uvs
+    crossing = np.abs(edges[:, 0]) < np.abs(edges[:, 1])
+    edgeLengths = (uvs[:, 0] + uvs[nextLoops, 0]) * 0.5 - start
+    candidates = start + np.unique(edgeLengths[crossing])
+
+    cuts = CutPositions(candidates, start, end, right - left)
+    if not cuts:
+        return 1, 0
+
+    # pieces by face center
+    faceCenters = np.bincount(loopFaces, weights=uvs[:, 0]) / faceSizes
+    facePieces = np.searchsorted(np.array(cuts), faceCenters, side='right')
+    loopPieces = facePieces[loopFaces]
+
+    numPieces = len(cuts) + 1
+    pieceStarts = np.full(numPieces, np.inf)
+    np.minimum.at(pieceStarts, loopPieces, uvs[:, 0])
+
+    # pieces without faces do not take a trim
+    filled = np.isfinite(pieceStarts)
+    slots = np.cumsum(filled) - 1
+
+    shift = np.zeros((numPieces, 2))
+    shift[filled, 0] = left - pieceStarts[filled]
+    tiled = 0
+    if layout == 'TRIMS':
+        first = next(index for index, trim in enumerate(trimDefs) if trim is trimDef)
+        following = [trim for trim in trimDefs[first:] if abs(trim.height - trimDef.height) < EPSILON and
+                     abs(trim.width - trimDef.width) < EPSILON]
+        for piece in np.nonzero(filled)[0].tolist():
+            if slots[piece] < len(following):
+                target = following[slots[piece]]
+                shift[piece, 0] += target.x_offset - trimDef.x_offset
+                shift[piece, 1] += target.y_offset - trimDef.y_offset
+        tiled = max(0, int(filled.sum()) - len(following))
+
+    utils.SetUVs(loops, uvs + shift[loopPieces])
+
+    # only crossing edges lying on a cut can separate two pieces
+    onCut = crossing & np.isin(edgeLengths + start, cuts)
+    for index in np.nonzero(onCut)[0].tolist():
+        loops[index].edge.seam = True
+
+    return int(filled.sum()), tiled
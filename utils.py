@@ -19,16 +19,30 @@
 
 Most functions here will be deprecated"""
 
+import hashlib
 import math
 
 import bmesh
 import bpy
 import mathutils
+import numpy as np
 
 from . import global_def, geometry
 
-def InitBMesh():
-    """Init global bmesh."""
+def InitBMesh(mesh=None):
+    """Init global bmesh.
+
+    :param mesh: read this mesh instead of the edit mesh. The bmesh is a
+        copy owned by the caller and no uv layer is created on it.
+    :type mesh: :class:`bpy.types.Mesh`
+    """
+    if mesh is not None:
+        global_def.bm = bmesh.new()
+        global_def.bm.from_mesh(mesh)
+        global_def.bm.faces.ensure_lookup_table()
+        global_def.uvlayer = global_def.bm.loops.layers.uv.active
+        return
+
     global_def.bm = bmesh.from_edit_mesh(bpy.context.edit_object.data)
     global_def.bm.faces.ensure_lookup_table()
     # uvlayer = bm.loops.layers.uv.active
@@ -42,3 +56,123 @@ def update():
     bmesh.update_edit_mesh(bpy.context.edit_object.data, loop_triangles=False, destructive=False)
     # bm.to_mesh(bpy.context.object.data)
     # bm.free()
+
+
+def IslandLoops(islands):
+    """Return the loops of all islands and the island index of every loop."""
+    loops = []
+    labels = []
+    for index, island in enumerate(islands):
+        for face_id in island:
+            for loop in global_def.bm.faces[face_id].loops:
+                loops.append(loop)
+                labels.append(index)
+
+    return loops, np.array(labels, dtype=np.int32)
+
+
+def GetUVs(loops):
+    """Return the uvs of 'loops' as a (n, 2) array."""
+    uvlayer = global_def.uvlayer
+    uvs = np.array([loop[uvlayer].uv.to_tuple() for loop in loops], dtype=np.float64)
+    return uvs.reshape(-1, 2)
+
+
+def SetUVs(loops, uvs):
+    """Write a (n, 2) array of uvs back to 'loops'."""
+    uvlayer = global_def.uvlayer
+    for loop, uv in zip(loops, uvs.tolist()):
+        loop[uvlayer].uv = uv
+
+
+def LoopFaces(mesh):
+    """Return the face index of every loop of 'mesh'."""
+    numFaces = len(mesh.polygons)
+    loopStarts = np.empty(numFaces, dtype=np.int32)
+    loopTotals = np.empty(numFaces, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loopStarts)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+
+    offsets = np.repeat(np.cumsum(loopTotals) - loopTotals, loopTotals)
+    loopIndices = np.repeat(loopStarts, loopTotals) + np.arange(len(mesh.loops)) - offsets
+
+    loopFaces = np.empty(len(mesh.loops), dtype=np.int32)
+    loopFaces[loopIndices] = np.repeat(np.arange(numFaces, dtype=np.int32), loopTotals)
+    return loopFaces
+
+
+def LoopLabels(mesh, uvs):
+    """Return the uv island index of every loop of 'mesh'.
+
+    Array version of :class:`.MakeIslands`: faces sharing a vertex with
+    the same uv, rounded to 5 digits, belong to the same island. Labels are
+    propagated between faces and shared uvs until they settle.
+
+    :param mesh: the mesh to label.
+    :type mesh: :class:`bpy.types.Mesh`
+    :param uvs: (n, 2) uvs of the mesh loops.
+    :return: island indices starting at 0 and the number of islands.
+    :rtype: tuple
+    """
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get("vertex_index", loopVerts)
+    loopFaces = LoopFaces(mesh)
+
+    quantized = np.round(np.asarray(uvs, dtype=np.float64) * 1.0e5).astype(np.int64)
+    keys = np.stack((quantized[:, 0], quantized[:, 1], loopVerts), axis=1)
+    loopKeys = np.unique(keys, axis=0, return_inverse=True)[1].ravel()
+
+    faceLabels = np.arange(len(mesh.polygons), dtype=np.int64)
+    keyLabels = np.empty(loopKeys.max() + 1 if len(loopKeys) else 0, dtype=np.int64)
+    while True:
+        keyLabels.fill(len(faceLabels))
+        np.minimum.at(keyLabels, loopKeys, faceLabels[loopFaces])
+        newLabels = faceLabels.copy()
+        np.minimum.at(newLabels, loopFaces, keyLabels[loopKeys])
+        newLabels = newLabels[newLabels]
+        if np.array_equal(newLabels, faceLabels):
+            break
+        faceLabels = newLabels
+
+    faceIslands, labels = np.unique(faceLabels, return_inverse=True)
+    return labels.ravel()[loopFaces].astype(np.int32), len(faceIslands)
+
+
+def IslandBounds(uvs, labels, count):
+    """Return the lowest and highest uv corner of every island.
+
+    :param uvs: (n, 2) uvs of the island loops.
+    :param labels: island index of every loop.
+    :param count: number of islands.
+    :rtype: tuple
+    """
+    lowest = np.full((count, 2), np.inf)
+    highest = np.full((count, 2), -np.inf)
+    np.minimum.at(lowest, labels, uvs)
+    np.maximum.at(highest, labels, uvs)
+    return lowest, highest
+
+
+def ShapeKeys(uvs, labels, lowest):
+    """Return a key per island that only depends on its uv shape.
+
+    Uvs are taken relative to the lowest island corner, quantized to 5
+    digits like the island detection and sorted, then digested with
+    SHA-1 together with the loop count.
+
+    :param uvs: (n, 2) uvs of the island loops.
+    :param labels: island index of every loop.
+    :param lowest: lowest uv corner of every island.
+    :rtype: list
+    """
+    quantized = np.round((uvs - lowest[labels]) * 1.0e5).astype(np.int64)
+    order = np.lexsort((quantized[:, 1], quantized[:, 0], labels))
+    quantized = quantized[order]
+
+    keys = []
+    start = 0
+    for end in np.cumsum(np.bincount(labels, minlength=len(lowest))).tolist():
+        keys.append((end - start, hashlib.sha1(quantized[start:end].tobytes()).digest()))
+        start = end
+
+    return keys